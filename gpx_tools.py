@@ -9,8 +9,17 @@ Written by Mikhail Veltishchev.
 Kudos: Yulia Yaneeva for filtering idea and initial implementation.
 """
 
+# annotations must stay lazy: np.ndarray in signatures would blow up at
+# import time when numpy is absent and np is None
+from __future__ import annotations
+
 import typing as tp
+import array
+import copy
 import glob
+import logging
+import logging.handlers
+import math
 import os
 import sys
 import argparse
@@ -18,24 +27,80 @@ import datetime
 import hashlib
 
 # import tqdm
-import shutil
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from xml.etree import ElementTree as ET
-from geopy import distance as gd
-
+from xml.parsers import expat
+from lxml import etree as ET
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy is optional: tiny installations fall back to array.array
+    # buffers and the interpreted kernels
+    np = None
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional: without it the kernels run interpreted
+    njit = None
+
+try:
+    from xxhash import xxh64_intdigest as _time_key
+except ImportError:
+    # the built-in str hash is a fine 64-bit dedupe key too; xxhash is
+    # just faster on long strings
+    _time_key = hash
+
+try:
+    from ciso8601 import parse_datetime as _parse_datetime
+except ImportError:
+    # ciso8601 is optional: stdlib ISO parsing is ~50x slower but fine
+    def _parse_datetime(value):
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+# per-item diagnostics go through a buffered logger so hot loops never
+# stall on a stdout flush per segment; summaries stay on print
+log = logging.getLogger(__name__)
 
 _DISTANCE_THRESHOLD = 15
 _SMOOTH_POINT_COUNT = 5
+# points climbing/descending more than this many meters relative to
+# their predecessor are never smoothed away
+_ELEVATION_THRESHOLD = 1
+
+# mean Earth radius, meters (IUGG)
+_EARTH_RADIUS = 6371008.8
 
 _NS = "http://www.topografix.com/GPX/1/1"
 _GNS = {"g": _NS}
 
+# namespace-qualified tag names, precomputed once: exact-tag lookups
+# skip both the XPath parsing and the `{*}` wildcard namespace matching
+_TRK_TAG = f"{{{_NS}}}trk"
+_TRKSEG_TAG = f"{{{_NS}}}trkseg"
+_TRKPT_TAG = f"{{{_NS}}}trkpt"
+_WPT_TAG = f"{{{_NS}}}wpt"
+_ELE_TAG = f"{{{_NS}}}ele"
+_TIME_TAG = f"{{{_NS}}}time"
+
+# strip indentation whitespace on parse so that pretty-printing
+# re-indents the merged tree properly
+_PARSER = ET.XMLParser(remove_blank_text=True)
+
+# XPath expressions compiled once: evaluation runs entirely inside
+# libxml2 instead of re-parsing the expression per call
+_XP_TRKPTS = ET.XPath("g:trkpt", namespaces=_GNS)
+_XP_TRKPT_TIMES = ET.XPath("g:trkpt/g:time/text()", namespaces=_GNS, smart_strings=False)
+_XP_SEGMENTS = ET.XPath("g:trk/g:trkseg", namespaces=_GNS)
+
 
 class GPX:
     """GPX Parser"""
     def __init__(input_file_name: str):
-        self._tree = ET.parse(input_file_name)
+        self._tree = ET.parse(input_file_name, _PARSER)
         self._root = self.tree.getroot()
 
     @property
@@ -48,22 +113,432 @@ class GPX:
 
 
 
-def _write_gpx(output_file_name: str, tree: ET):
-    """Write formatted GPX to file"""
+def _parse_gpx(input_file_name: str) -> ET._ElementTree:
+    """Parse one GPX file with a parser of its own, safe to call from threads"""
+    return ET.parse(input_file_name, ET.XMLParser(remove_blank_text=True))
+
+
+def _write_gpx(output_file_name: str, tree: ET._ElementTree, pretty: bool=True):
+    """
+    Write GPX to file
+
+    Intermediate results that are parsed right back can skip the
+    pretty-printing tree walk with `pretty=False`.
+    """
     print(f"Writing GPX to {output_file_name}...")
-    ET.indent(tree, space="    ")
-    tree.write(output_file_name, encoding="UTF-8")
+    tree.write(output_file_name, pretty_print=pretty, xml_declaration=True, encoding="UTF-8")
+
+
+def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Great-circle distance in meters between two points given in radians.
+
+    Spherical approximation is accurate to ~0.5%, which is way below
+    the meter-scale thresholds used for smoothing.
+    """
+    half_dlat = (lat2 - lat1) / 2
+    half_dlon = (lon2 - lon1) / 2
+    a = math.sin(half_dlat) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(half_dlon) ** 2
+    return 2 * _EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+def _vincenty_wgs84(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Vincenty inverse distance in meters on the WGS-84 ellipsoid,
+    radian inputs.
+
+    The ellipsoid constants are literals so the JIT sees them as
+    immediates; opt in via --precise-distance when sub-meter accuracy
+    matters more than speed.
+    """
+    a = 6378137.0
+    f = 1.0 / 298.257223563
+    b = (1.0 - f) * a
+
+    u1 = math.atan((1.0 - f) * math.tan(lat1))
+    u2 = math.atan((1.0 - f) * math.tan(lat2))
+    sin_u1, cos_u1 = math.sin(u1), math.cos(u1)
+    sin_u2, cos_u2 = math.sin(u2), math.cos(u2)
+
+    delta_lon = lon2 - lon1
+    lam = delta_lon
+    sin_sigma = 0.0
+    cos_sigma = 1.0
+    sigma = 0.0
+    cos2_alpha = 1.0
+    cos_2sigma_m = 0.0
+
+    for _iteration in range(100):
+        sin_lam, cos_lam = math.sin(lam), math.cos(lam)
+        sin_sigma = math.sqrt(
+            (cos_u2 * sin_lam) ** 2
+            + (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam) ** 2
+        )
+        if sin_sigma == 0.0:
+            # coincident points
+            return 0.0
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = math.atan2(sin_sigma, cos_sigma)
+        sin_alpha = cos_u1 * cos_u2 * sin_lam / sin_sigma
+        cos2_alpha = 1.0 - sin_alpha ** 2
+        if cos2_alpha != 0.0:
+            cos_2sigma_m = cos_sigma - 2.0 * sin_u1 * sin_u2 / cos2_alpha
+        else:
+            # equatorial line
+            cos_2sigma_m = 0.0
+        c = f / 16.0 * cos2_alpha * (4.0 + f * (4.0 - 3.0 * cos2_alpha))
+        lam_previous = lam
+        lam = delta_lon + (1.0 - c) * f * sin_alpha * (
+            sigma + c * sin_sigma * (
+                cos_2sigma_m + c * cos_sigma * (-1.0 + 2.0 * cos_2sigma_m ** 2)
+            )
+        )
+        if abs(lam - lam_previous) < 1e-12:
+            break
+
+    u_squared = cos2_alpha * (a * a - b * b) / (b * b)
+    big_a = 1.0 + u_squared / 16384.0 * (
+        4096.0 + u_squared * (-768.0 + u_squared * (320.0 - 175.0 * u_squared))
+    )
+    big_b = u_squared / 1024.0 * (
+        256.0 + u_squared * (-128.0 + u_squared * (74.0 - 47.0 * u_squared))
+    )
+    delta_sigma = big_b * sin_sigma * (
+        cos_2sigma_m + big_b / 4.0 * (
+            cos_sigma * (-1.0 + 2.0 * cos_2sigma_m ** 2)
+            - big_b / 6.0 * cos_2sigma_m
+            * (-3.0 + 4.0 * sin_sigma ** 2)
+            * (-3.0 + 4.0 * cos_2sigma_m ** 2)
+        )
+    )
+    return b * big_a * (sigma - delta_sigma)
+
+
+def _smooth_kernel(lat, lon, elevation_significant, distance_threshold, smooth_point_count, precise):
+    """
+    Sliding-window smoothing over radian coordinate arrays.
+
+    Returns a boolean keep-mask; the caller is responsible for dropping
+    the masked-out XML nodes. Points flagged in `elevation_significant`
+    survive every collapse so the elevation profile is preserved. Kept
+    free of Python objects so that numba can compile it to machine code.
+    """
+    n = lat.shape[0]
+    keep = np.ones(n, np.bool_)
+    # a collapse leaves two points in the window before the next index
+    # is appended, so the buffer must hold at least three entries even
+    # for degenerate window counts
+    window = np.empty(max(smooth_point_count, 3), np.int64)
+    window_length = 0
+
+    # every point participates in up to `smooth_point_count` windows;
+    # taking the cosine once instead of per window pays off
+    cos_lat = np.cos(lat)
+
+    for index in range(n):
+        window[window_length] = index
+        window_length += 1
+
+        if window_length < smooth_point_count:
+            continue
+
+        # enough points to smooth
+        first = window[0]
+        last = window[window_length - 1]
+        if precise:
+            diff = _vincenty_wgs84(lat[first], lon[first], lat[last], lon[last])
+        else:
+            half_dlat = (lat[last] - lat[first]) / 2
+            half_dlon = (lon[last] - lon[first]) / 2
+            a = math.sin(half_dlat) ** 2 \
+                + cos_lat[first] * cos_lat[last] * math.sin(half_dlon) ** 2
+            diff = 2 * _EARTH_RADIUS * math.asin(math.sqrt(a))
+
+        if diff < distance_threshold:
+            # drop entire window except the endpoints and any point
+            # with a notable elevation change
+            for middle in range(1, window_length - 1):
+                if not elevation_significant[window[middle]]:
+                    keep[window[middle]] = False
+            window[1] = last
+            window_length = 2
+            continue
+
+        # shift script
+        for shifted in range(window_length - 1):
+            window[shifted] = window[shifted + 1]
+        window_length -= 1
+
+    return keep
+
+
+if njit is not None and np is not None:
+    _vincenty_wgs84 = njit(cache=True)(_vincenty_wgs84)
+    _smooth_kernel = njit(cache=True, fastmath=True)(_smooth_kernel)
+
+
+def _smooth_kernel_fallback(lat, lon, elevation_significant, distance_threshold, smooth_point_count, precise):
+    """
+    numpy-free mirror of `_smooth_kernel` over array.array buffers.
+
+    Returns a list of kept flags; still contiguous C doubles underneath,
+    just without the vectorized allocation helpers.
+    """
+    # LOAD_FAST locals and a precomputed cosine table keep the
+    # interpreted loop as tight as it gets
+    sin, cos, asin, sqrt = math.sin, math.cos, math.asin, math.sqrt
+    n = len(lat)
+    cos_lat = [cos(value) for value in lat]
+    keep = [True] * n
+    window = []
+
+    for index in range(n):
+        window.append(index)
+
+        if len(window) < smooth_point_count:
+            continue
+
+        first, last = window[0], window[-1]
+        if precise:
+            diff = _vincenty_wgs84(lat[first], lon[first], lat[last], lon[last])
+        else:
+            half_dlat = (lat[last] - lat[first]) / 2
+            half_dlon = (lon[last] - lon[first]) / 2
+            a = sin(half_dlat) ** 2 + cos_lat[first] * cos_lat[last] * sin(half_dlon) ** 2
+            diff = 2 * _EARTH_RADIUS * asin(sqrt(a))
+
+        if diff < distance_threshold:
+            for middle in window[1:-1]:
+                if not elevation_significant[middle]:
+                    keep[middle] = False
+            window = [first, last]
+            continue
+
+        window = window[1:]
+
+    return keep
+
+
+def _thin_kernel(lat, lon, elevation, distance_threshold, elevation_threshold):
+    """
+    Distance-accumulating track thinning over radian coordinate arrays.
+
+    A point survives when it lies at least `distance_threshold` meters
+    from the last kept point or its elevation differs by more than
+    `elevation_threshold` meters; endpoints always survive. Returns a
+    boolean keep-mask, numba-compilable like the smoothing kernel.
+    """
+    n = lat.shape[0]
+    keep = np.zeros(n, np.bool_)
+    if n == 0:
+        return keep
+
+    keep[0] = True
+    cos_lat = np.cos(lat)
+    anchor = 0
+
+    for index in range(1, n):
+        half_dlat = (lat[index] - lat[anchor]) / 2
+        half_dlon = (lon[index] - lon[anchor]) / 2
+        a = math.sin(half_dlat) ** 2 \
+            + cos_lat[anchor] * cos_lat[index] * math.sin(half_dlon) ** 2
+        diff = 2 * _EARTH_RADIUS * math.asin(math.sqrt(a))
+
+        if diff >= distance_threshold \
+                or abs(elevation[index] - elevation[anchor]) > elevation_threshold:
+            keep[index] = True
+            anchor = index
+
+    keep[n - 1] = True
+    return keep
+
+
+if njit is not None and np is not None:
+    _thin_kernel = njit(cache=True, fastmath=True)(_thin_kernel)
+
+
+def _thin_kernel_fallback(lat, lon, elevation, distance_threshold, elevation_threshold):
+    """numpy-free mirror of `_thin_kernel`"""
+    sin, cos, asin, sqrt = math.sin, math.cos, math.asin, math.sqrt
+    n = len(lat)
+    keep = [False] * n
+    if not n:
+        return keep
+
+    keep[0] = True
+    cos_lat = [cos(value) for value in lat]
+    anchor = 0
+
+    for index in range(1, n):
+        half_dlat = (lat[index] - lat[anchor]) / 2
+        half_dlon = (lon[index] - lon[anchor]) / 2
+        a = sin(half_dlat) ** 2 + cos_lat[anchor] * cos_lat[index] * sin(half_dlon) ** 2
+        diff = 2 * _EARTH_RADIUS * asin(sqrt(a))
+
+        if diff >= distance_threshold \
+                or abs(elevation[index] - elevation[anchor]) > elevation_threshold:
+            keep[index] = True
+            anchor = index
+
+    keep[n - 1] = True
+    return keep
+
+
+def _fused_filter_kernel(lat, lon, elevation, duplicate, distance_threshold, elevation_threshold):
+    """
+    Timestamp dedupe fused with distance-threshold thinning: one pass,
+    one keep-mask, one child rebuild per segment instead of two.
+
+    Points flagged in `duplicate` never survive; the rest follow the
+    `_thin_kernel` anchor rule and the last unique point always stays.
+    """
+    n = lat.shape[0]
+    keep = np.zeros(n, np.bool_)
+    cos_lat = np.cos(lat)
+    anchor = -1
+    last_unique = -1
+
+    for index in range(n):
+        if duplicate[index]:
+            continue
+        last_unique = index
+
+        if anchor < 0:
+            keep[index] = True
+            anchor = index
+            continue
+
+        half_dlat = (lat[index] - lat[anchor]) / 2
+        half_dlon = (lon[index] - lon[anchor]) / 2
+        a = math.sin(half_dlat) ** 2 \
+            + cos_lat[anchor] * cos_lat[index] * math.sin(half_dlon) ** 2
+        diff = 2 * _EARTH_RADIUS * math.asin(math.sqrt(a))
+
+        if diff >= distance_threshold \
+                or abs(elevation[index] - elevation[anchor]) > elevation_threshold:
+            keep[index] = True
+            anchor = index
+
+    if last_unique >= 0:
+        keep[last_unique] = True
+    return keep
+
+
+if njit is not None and np is not None:
+    _fused_filter_kernel = njit(cache=True, fastmath=True)(_fused_filter_kernel)
+
+
+def _fused_filter_kernel_fallback(lat, lon, elevation, duplicate, distance_threshold, elevation_threshold):
+    """numpy-free mirror of `_fused_filter_kernel`"""
+    sin, cos, asin, sqrt = math.sin, math.cos, math.asin, math.sqrt
+    n = len(lat)
+    keep = [False] * n
+    cos_lat = [cos(value) for value in lat]
+    anchor = -1
+    last_unique = -1
+
+    for index in range(n):
+        if duplicate[index]:
+            continue
+        last_unique = index
+
+        if anchor < 0:
+            keep[index] = True
+            anchor = index
+            continue
+
+        half_dlat = (lat[index] - lat[anchor]) / 2
+        half_dlon = (lon[index] - lon[anchor]) / 2
+        a = sin(half_dlat) ** 2 + cos_lat[anchor] * cos_lat[index] * sin(half_dlon) ** 2
+        diff = 2 * _EARTH_RADIUS * asin(sqrt(a))
+
+        if diff >= distance_threshold \
+                or abs(elevation[index] - elevation[anchor]) > elevation_threshold:
+            keep[index] = True
+            anchor = index
+
+    if last_unique >= 0:
+        keep[last_unique] = True
+    return keep
+
+
+def _coordinate_arrays(nodes) -> tp.Tuple[np.ndarray, np.ndarray]:
+    """
+    Lat/lon of the given points as radian arrays.
+
+    The attribute strings are converted in one numpy C-level pass
+    instead of a Python float() call per point; without numpy the
+    coordinates land in compact array.array('d') buffers.
+    """
+    if np is not None:
+        lat = np.array([node.get("lat") for node in nodes], dtype=np.float64)
+        lon = np.array([node.get("lon") for node in nodes], dtype=np.float64)
+        return np.deg2rad(lat), np.deg2rad(lon)
+
+    lat = array.array("d", (math.radians(float(node.get("lat"))) for node in nodes))
+    lon = array.array("d", (math.radians(float(node.get("lon"))) for node in nodes))
+    return lat, lon
+
+
+def _segment_to_arrays(track_segment):
+    """
+    Struct-of-arrays view of one segment: `(nodes, lat, lon, elevation)`
+    with the coordinates in radians and missing elevations as 0.
+
+    The XML nodes are walked exactly once here; the numeric passes then
+    run over contiguous float buffers and only come back to the tree
+    through `_apply_segment_mask`.
+    """
+    nodes = track_segment.findall(_TRKPT_TAG)
+    lat_text = [node.get("lat") for node in nodes]
+    lon_text = [node.get("lon") for node in nodes]
+    elevation_text = [node.findtext(_ELE_TAG, "0") for node in nodes]
+
+    if np is not None:
+        lat = np.deg2rad(np.array(lat_text, dtype=np.float64))
+        lon = np.deg2rad(np.array(lon_text, dtype=np.float64))
+        elevation = np.array(elevation_text, dtype=np.float64)
+    else:
+        lat = array.array("d", (math.radians(float(value)) for value in lat_text))
+        lon = array.array("d", (math.radians(float(value)) for value in lon_text))
+        elevation = array.array("d", (float(value) for value in elevation_text))
+
+    return nodes, lat, lon, elevation
+
+
+def _apply_segment_mask(track_segment, nodes, keep) -> int:
+    """
+    Drop the masked-out points from a segment in one slice rebuild,
+    returning how many were removed
+    """
+    removed_nodes = {
+        nodes[index] for index, kept in enumerate(keep) if not kept
+    }
+    if removed_nodes:
+        track_segment[:] = [
+            child for child in track_segment if child not in removed_nodes
+        ]
+    return len(removed_nodes)
 
 
-def _get_elevation(point):
-    elevation_elem = point.find("{*}ele")
-    if elevation_elem is not None:
-        return float(elevation_elem.text)
-    return 0
+def _elevation_significance(elevation):
+    """
+    Boolean mask of points whose elevation differs from the previous
+    point by more than the threshold, precomputed in one vector op.
+    """
+    if np is not None:
+        significant = np.zeros(len(elevation), dtype=np.bool_)
+        significant[1:] = np.abs(np.diff(elevation)) > _ELEVATION_THRESHOLD
+        return significant
+
+    return [False] + [
+        abs(elevation[index] - elevation[index - 1]) > _ELEVATION_THRESHOLD
+        for index in range(1, len(elevation))
+    ]
 
 
 def _get_time(point):
-    time_elem = point.find("{*}time")
+    time_elem = point.find(_TIME_TAG)
     if time_elem is not None:
         if "1970-01-01T00:00:0" in time_elem.text:
             # calculate fake time
@@ -74,62 +549,81 @@ def _get_time(point):
             m.update(lon.encode("utf-8"))
             point_int_hash = int(m.hexdigest()[0:4], 16)
             fake_time = datetime.datetime.utcfromtimestamp(point_int_hash)
-            # print(fake_time)
+            log.debug("fake time %s for point %s,%s", fake_time, lat, lon)
             return fake_time
 
         return time_elem.text
     return ""
 
 
+def _dedupe_key(time) -> int:
+    """
+    Normalized 64-bit dedupe key for a point time.
+
+    Parsing to epoch microseconds makes timestamps that differ only in
+    spelling ('Z' vs '+00:00', trailing fraction zeros) collide as the
+    duplicates they are. Fake times arrive as datetimes already;
+    unparseable strings fall back to the hashed raw text.
+    """
+    if isinstance(time, datetime.datetime):
+        return int(time.timestamp() * 1_000_000)
+    try:
+        return int(_parse_datetime(time).timestamp() * 1_000_000)
+    except ValueError:
+        return _time_key(time)
+
+
+def _segment_times(track_segment) -> tp.List[tp.Tuple[ET._Element, str]]:
+    """
+    Read all point times of one segment in a single batched XPath call.
+
+    Falls back to the per-point lookup when some points have no time
+    or carry the fake 1970 timestamps.
+    """
+    points = _XP_TRKPTS(track_segment)
+    times = _XP_TRKPT_TIMES(track_segment)
+    if len(times) == len(points) and not any("1970-01-01T00:00:0" in t for t in times):
+        return list(zip(points, times))
+    return [(point, _get_time(point)) for point in points]
+
+
 def _get_track_list(output_file_name, current_directory=".") -> tp.List[str]:
+    # one string normalization per path instead of a realpath() syscall
+    # for every glob hit
     glob_path = os.path.join(current_directory, "*.gpx")
-    output_path = Path(output_file_name).resolve()
+    output_path = os.path.normcase(os.path.abspath(output_file_name))
     return sorted(
-        file_name for file_name in glob.glob(glob_path)
-        if Path(file_name).resolve() != output_path
+        file_name for file_name in glob.iglob(glob_path)
+        if os.path.normcase(os.path.abspath(file_name)) != output_path
     )
 
 
-def _merge_tracks(
-    left_file_name: str,
-    right_file_name: str,
-    output_file_name: tp.Optional[str]=None,
-) -> None:
+def _merge_roots(left_root, right_root) -> None:
     """
-    Merge `right_file_name` track data into `left_file_name` track data
+    Merge track segments and waypoints of `right_root` into `left_root`
     """
-    if output_file_name is None:
-        output_file_name = left_file_name
-
-    print(f"Merging {left_file_name} with {right_file_name} into {output_file_name}...")
-
-    left_tree = ET.parse(left_file_name)
-    right_tree = ET.parse(right_file_name)
-    left_root = left_tree.getroot()
-    right_root = right_tree.getroot()
-
-    all_left_trks = left_root.findall("g:trk", _GNS)
+    all_left_trks = left_root.findall(_TRK_TAG)
     if len(all_left_trks) > 1:
         raise ValueError(
-            f"More than one `trk` in file {left_file_name}, "
+            "More than one `trk` in merge target, "
             "GPX seems to be invalid. Please report to author. "
         )
 
-    right_segments = right_root.findall("g:trk/g:trkseg", _GNS)
+    right_segments = _XP_SEGMENTS(right_root)
 
     main_trk = None
     if all_left_trks:
         main_trk = all_left_trks[0]
     else:
         if right_segments:
-            main_trk = ET.SubElement(left_root, "trk")
+            main_trk = ET.SubElement(left_root, _TRK_TAG)
 
     if main_trk is not None:
         # merge tracks
         added_segments = 0
         for right_track_segment in right_segments:
             main_trk.append(right_track_segment)
-            # print("  Added segment to main track")
+            log.debug("  Added segment to main track")
             added_segments += 1
         if added_segments:
             print(f"Merged {added_segments} segments")
@@ -137,26 +631,93 @@ def _merge_tracks(
         print("No track info found")
 
     added_waypoints = 0
-    for wpt in right_root.iterfind("g:wpt", _GNS):
+    for wpt in right_root.iterfind(_WPT_TAG):
         added_waypoints += 1
         left_root.append(wpt)
 
     if added_waypoints:
         print(f"Merged {added_waypoints} waypoints")
 
+
+def _merge_tracks(
+    left_file_name: str,
+    right_file_name: str,
+    output_file_name: tp.Optional[str]=None,
+) -> None:
+    """
+    Merge `right_file_name` track data into `left_file_name` track data
+    """
+    if output_file_name is None:
+        output_file_name = left_file_name
+
+    print(f"Merging {left_file_name} with {right_file_name} into {output_file_name}...")
+
+    left_tree = ET.parse(left_file_name, _PARSER)
+    right_tree = ET.parse(right_file_name, _PARSER)
+    _merge_roots(left_tree.getroot(), right_tree.getroot())
+
     _write_gpx(output_file_name, left_tree)
 
 
-def _filter_duplicates(input_file_name: str, output_file_name: str=None) -> None:
+def _track_stats(input_file_name: str) -> tp.Tuple[int, int, int, float]:
     """
-    Remove duplicated points from track
+    Count waypoints, segments and points and total up the track length
+    without building a DOM.
+
+    Expat start-element callbacks push lat/lon straight into plain
+    float buffers, so the read-only --dry-run path never allocates an
+    Element per point; the callback dispatch and the string-to-double
+    conversion both run in C.
     """
-    if output_file_name is None:
-        output_file_name = input_file_name
+    lat = array.array("d")
+    lon = array.array("d")
+    segment_starts = []
+    counters = {"wpt": 0, "trkseg": 0, "trkpt": 0}
+
+    def start_element(name, attributes):
+        if name.endswith("trkpt"):
+            lat.append(math.radians(float(attributes["lat"])))
+            lon.append(math.radians(float(attributes["lon"])))
+            counters["trkpt"] += 1
+        elif name.endswith("trkseg"):
+            segment_starts.append(len(lat))
+            counters["trkseg"] += 1
+        elif name.endswith("wpt"):
+            counters["wpt"] += 1
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = start_element
+    with open(input_file_name, "rb") as stream:
+        parser.ParseFile(stream)
+
+    length = 0.0
+    if np is not None and len(lat) > 1:
+        lat_array = np.frombuffer(lat, dtype=np.float64)
+        lon_array = np.frombuffer(lon, dtype=np.float64)
+        half_dlat = np.diff(lat_array) / 2
+        half_dlon = np.diff(lon_array) / 2
+        a = np.sin(half_dlat) ** 2 \
+            + np.cos(lat_array[:-1]) * np.cos(lat_array[1:]) * np.sin(half_dlon) ** 2
+        steps = 2 * _EARTH_RADIUS * np.arcsin(np.sqrt(a))
+        # distances never span a segment boundary
+        for start in segment_starts:
+            if 0 < start < len(steps) + 1:
+                steps[start - 1] = 0.0
+        length = float(steps.sum())
+    else:
+        boundaries = set(segment_starts)
+        for index in range(1, len(lat)):
+            if index in boundaries:
+                continue
+            length += _haversine(lat[index - 1], lon[index - 1], lat[index], lon[index])
 
-    print(f"Filter duplicates from {input_file_name} to {output_file_name}")
+    return counters["wpt"], counters["trkseg"], counters["trkpt"], length
 
-    tree = ET.parse(input_file_name)
+
+def _filter_duplicates_tree(tree: ET._ElementTree) -> None:
+    """
+    Remove duplicated points from an already parsed track, in place
+    """
     root = tree.getroot()
 
     all_timestamps = set()
@@ -164,21 +725,219 @@ def _filter_duplicates(input_file_name: str, output_file_name: str=None) -> None
     point_count = 0
     removed_point_count = 0
     # remove duplicate points
-    trk = root.find("g:trk", _GNS)
-    for track_segment in trk.findall("g:trkseg", _GNS):
-        for point in track_segment.findall("g:trkpt", _GNS):
-            time = _get_time(point)
+    trk = root.find(_TRK_TAG)
+    for track_segment in trk.findall(_TRKSEG_TAG):
+        kept_in_segment = 0
+        duplicate_nodes = set()
+        # removal is deferred to the rebuild below, so no snapshot needed
+        for point in track_segment.iterfind(_TRKPT_TAG):
+            # store a 64-bit key instead of the ~25-byte string: the set
+            # stays an order of magnitude smaller on huge merges
+            time_key = _dedupe_key(_get_time(point))
             point_count += 1
 
-            if time in all_timestamps:
+            if time_key in all_timestamps:
                 removed_point_count += 1
-                track_segment.remove(point)
+                duplicate_nodes.add(point)
                 continue
 
-            all_timestamps.add(time)
+            all_timestamps.add(time_key)
+            kept_in_segment += 1
+
+        if duplicate_nodes:
+            # one-pass rebuild instead of a linear remove per duplicate
+            track_segment[:] = [
+                child for child in track_segment if child not in duplicate_nodes
+            ]
+
+        # the counter replaces a second full point walk here
+        if not kept_in_segment:
+            # remove empty segment
+            trk.remove(track_segment)
+
+    # sanity check
+    if point_count - len(all_timestamps) != removed_point_count:
+        raise Exception("Removed point count does not match, please report to script author. ")
+
+    print(
+        f"Filtered {removed_point_count} points from {point_count} "
+        f"and {len(all_timestamps)} points remaining"
+    )
+
+
+def _filter_simplify_tree(tree: ET._ElementTree, distance_threshold=_DISTANCE_THRESHOLD) -> None:
+    """
+    Duplicate filter and simplification fused into one pass, in place.
+
+    Running `_filter_duplicates_tree` and `_simplify_track_tree` back to
+    back reads every point twice and rebuilds each segment's children
+    twice; here one walk builds the arrays and duplicate flags and a
+    single kernel emits the combined keep-mask.
+    """
+    root = tree.getroot()
+
+    all_timestamps = set()
+    point_count = 0
+    removed_point_count = 0
+
+    trk = root.find(_TRK_TAG)
+    for track_segment in trk.findall(_TRKSEG_TAG):
+        nodes, lat, lon, elevation = _segment_to_arrays(track_segment)
+        point_count += len(nodes)
+
+        if np is not None:
+            duplicate = np.zeros(len(nodes), dtype=np.bool_)
+        else:
+            duplicate = [False] * len(nodes)
+        for index, (_point, time) in enumerate(_segment_times(track_segment)):
+            time_key = _dedupe_key(time)
+            if time_key in all_timestamps:
+                duplicate[index] = True
+            else:
+                all_timestamps.add(time_key)
+
+        if np is not None:
+            keep = _fused_filter_kernel(
+                lat, lon, elevation, duplicate,
+                float(distance_threshold), float(_ELEVATION_THRESHOLD),
+            )
+        else:
+            keep = _fused_filter_kernel_fallback(
+                lat, lon, elevation, duplicate,
+                float(distance_threshold), float(_ELEVATION_THRESHOLD),
+            )
 
-        # check whether at least one point remains in segment
-        if not track_segment.findall("g:trkpt", _GNS):
+        removed_point_count += _apply_segment_mask(track_segment, nodes, keep)
+        if not any(keep):
+            # remove empty segment
+            trk.remove(track_segment)
+
+    remaining_point_count = point_count - removed_point_count
+    print(
+        f"Filtered and simplified {removed_point_count} points from {point_count}, "
+        f"{remaining_point_count} remains at {distance_threshold}m"
+    )
+
+
+def _stream_merge(track_file_names: tp.List[str], output_file_name: str) -> None:
+    """
+    Merge inputs into the output with the incremental xmlfile writer.
+
+    The in-memory merge in `main` holds every input tree at once; here
+    segments are copied straight from the iterparse stream to the
+    output and freed immediately, so peak memory stays bounded by one
+    segment no matter how many daily files are merged. Each input is
+    read twice: once for waypoints, once for segments.
+    """
+    print(f"Stream-merging {len(track_file_names)} files to {output_file_name}...")
+
+    # reuse the root attributes (version, creator) of the first input;
+    # an empty file yields no start event, so default to no attributes
+    root_attrib = {}
+    for _event, element in ET.iterparse(track_file_names[0], events=("start",)):
+        root_attrib = dict(element.attrib)
+        break
+
+    with ET.xmlfile(output_file_name, encoding="UTF-8") as xml_writer:
+        xml_writer.write_declaration()
+        with xml_writer.element(f"{{{_NS}}}gpx", attrib=root_attrib, nsmap={None: _NS}):
+            # gpx-level children (metadata, routes etc.) come from the
+            # first input, like the trk metadata below
+            for _event, element in ET.iterparse(track_file_names[0], events=("end",)):
+                parent = element.getparent()
+                if parent is None:
+                    continue
+                if parent.getparent() is None:
+                    if element.tag not in (_WPT_TAG, _TRK_TAG):
+                        xml_writer.write(element)
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del parent[0]
+                elif parent.tag == _TRK_TAG:
+                    # free completed segments early to keep memory bounded
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del parent[0]
+
+            # waypoints come before the track per the GPX schema
+            for input_file_name in track_file_names:
+                for _event, element in ET.iterparse(
+                    input_file_name, events=("end",), tag=_WPT_TAG,
+                ):
+                    xml_writer.write(element)
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+
+            with xml_writer.element(_TRK_TAG):
+                # track-level metadata (name etc.) comes from the first
+                # input, the same rule _split_by_days applies
+                for _event, element in ET.iterparse(
+                    track_file_names[0], events=("end",),
+                ):
+                    parent = element.getparent()
+                    if parent is None or parent.tag != _TRK_TAG:
+                        continue
+                    if element.tag != _TRKSEG_TAG:
+                        xml_writer.write(element)
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del parent[0]
+
+                for input_file_name in track_file_names:
+                    for _event, element in ET.iterparse(
+                        input_file_name, events=("end",), tag=_TRKSEG_TAG,
+                    ):
+                        xml_writer.write(element)
+                        element.clear()
+                        while element.getprevious() is not None:
+                            del element.getparent()[0]
+
+
+def _filter_duplicates(input_file_name: str, output_file_name: str=None, pretty: bool=True) -> None:
+    """
+    Remove duplicated points from track
+    """
+    if output_file_name is None:
+        output_file_name = input_file_name
+
+    print(f"Filter duplicates from {input_file_name} to {output_file_name}")
+
+    all_timestamps = set()
+
+    point_count = 0
+    removed_point_count = 0
+    kept_per_segment = {}
+
+    # stream over track points: duplicates are unlinked and freed as soon
+    # as they are parsed, so peak memory is bounded by the kept points only
+    context = ET.iterparse(
+        input_file_name,
+        events=("end",),
+        tag=_TRKPT_TAG,
+        remove_blank_text=True,
+    )
+    for _event, point in context:
+        time_key = _dedupe_key(_get_time(point))
+        point_count += 1
+        track_segment = point.getparent()
+
+        if time_key in all_timestamps:
+            removed_point_count += 1
+            track_segment.remove(point)
+            point.clear()
+            continue
+
+        all_timestamps.add(time_key)
+        kept_per_segment[track_segment] = kept_per_segment.get(track_segment, 0) + 1
+
+    root = context.root
+    tree = root.getroottree()
+
+    # drop segments left empty after deduplication, without re-walking points
+    trk = root.find(_TRK_TAG)
+    for track_segment in trk.findall(_TRKSEG_TAG):
+        if track_segment not in kept_per_segment:
             # remove empty segment
             trk.remove(track_segment)
 
@@ -190,39 +949,78 @@ def _filter_duplicates(input_file_name: str, output_file_name: str=None) -> None
         f"Filtered {removed_point_count} points from {point_count} "
         f"and {len(all_timestamps)} points remaining"
     )
-    _write_gpx(output_file_name, tree)
+    _write_gpx(output_file_name, tree, pretty=pretty)
 
 
-class Point:
-    """Parsed GPX point"""
-    def __init__(self, node: ET):
-        self.node = node
-        self.ele = _get_elevation(node)
-        self.time = _get_time(node)
-        self.lat = float(node.get("lat"))
-        self.lon = float(node.get("lon"))
+def _spatial_dedupe(
+    input_file_name: str,
+    output_file_name: str|None=None,
+    distance_threshold=_DISTANCE_THRESHOLD,
+    pretty: bool=True,
+) -> None:
+    """
+    Remove points closer than `distance_threshold` meters to an earlier
+    point anywhere in the track.
 
-    def __str__(self):
-        return f"{self.time}: {self.ele:10.02f} {self.lat:16.08f} {self.lon:16.08f}"
+    The time-based filter only catches exact duplicates; repeated imports
+    of the same ride produce near-duplicates with differing timestamps.
+    A k-d tree finds those in O(N log N) instead of comparing all pairs.
+    """
+    if output_file_name is None:
+        output_file_name = input_file_name
 
+    print(f"Spatial dedupe from {input_file_name} to {output_file_name}")
 
-class Segment:
-    """Pair of parsed track points: segment"""
-    def __init__(
-        self,
-        first: Point,
-        last: Point,
-    ):
-        self.first = first
-        self.last = last
+    tree = ET.parse(input_file_name, _PARSER)
+    _spatial_dedupe_tree(tree, distance_threshold=distance_threshold)
+    _write_gpx(output_file_name, tree, pretty=pretty)
 
-        first_point = first.lat, first.lon
-        last_point = last.lat, last.lon
-        self.distance = gd.geodesic(first_point, last_point, ellipsoid="WGS-84").m
 
-    def length(self):
-        """Segment length"""
-        return self.distance
+def _spatial_dedupe_tree(tree: ET._ElementTree, distance_threshold=_DISTANCE_THRESHOLD) -> None:
+    """
+    Spatially deduplicate an already parsed track, in place
+    """
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        _exit("scipy is required for --spatial-dedupe, please install it")
+
+    root = tree.getroot()
+    trk = root.find(_TRK_TAG)
+
+    segments = trk.findall(_TRKSEG_TAG)
+    segment_nodes = [track_segment.findall(_TRKPT_TAG) for track_segment in segments]
+    all_nodes = [node for nodes in segment_nodes for node in nodes]
+
+    lat, lon = _coordinate_arrays(all_nodes)
+
+    # project to local meters so the query radius is isotropic
+    x = _EARTH_RADIUS * lon * np.cos(lat.mean())
+    y = _EARTH_RADIUS * lat
+
+    kd_tree = cKDTree(np.column_stack([x, y]))
+
+    # keep the first point of every near-duplicate cluster
+    removed_indices = set()
+    for first, second in sorted(kd_tree.query_pairs(r=distance_threshold)):
+        if first not in removed_indices:
+            removed_indices.add(second)
+
+    removed_nodes = {all_nodes[index] for index in removed_indices}
+    for track_segment, nodes in zip(segments, segment_nodes):
+        if not removed_nodes.intersection(nodes):
+            continue
+        track_segment[:] = [
+            child for child in track_segment if child not in removed_nodes
+        ]
+        if not len(track_segment):
+            # remove empty segment
+            trk.remove(track_segment)
+
+    print(
+        f"Spatially deduplicated {len(removed_indices)} points "
+        f"from {len(all_nodes)}"
+    )
 
 
 def _smooth_track(
@@ -230,6 +1028,8 @@ def _smooth_track(
     output_file_name: str|None=None,
     distance_threshold=_DISTANCE_THRESHOLD,
     smooth_point_count=_SMOOTH_POINT_COUNT,
+    pretty: bool=True,
+    precise: bool=False,
 ) -> None:
     """
     Remove too close points
@@ -237,47 +1037,48 @@ def _smooth_track(
     if output_file_name is None:
         output_file_name = input_file_name
 
-    tree = ET.parse(input_file_name)
+    tree = ET.parse(input_file_name, _PARSER)
+    _smooth_track_tree(
+        tree,
+        distance_threshold=distance_threshold,
+        smooth_point_count=smooth_point_count,
+        precise=precise,
+    )
+    _write_gpx(output_file_name, tree, pretty=pretty)
+
+
+def _smooth_track_tree(
+    tree: ET._ElementTree,
+    distance_threshold=_DISTANCE_THRESHOLD,
+    smooth_point_count=_SMOOTH_POINT_COUNT,
+    precise: bool=False,
+) -> None:
+    """
+    Smooth an already parsed track, in place
+    """
     root = tree.getroot()
 
     point_count = 0
     removed_point_count = 0
 
-    for track_segment in root.iterfind("g:trk/g:trkseg", _GNS):
-        last_points = []
+    for track_segment in _XP_SEGMENTS(root):
+        nodes, lat, lon, elevation = _segment_to_arrays(track_segment)
+        point_count += len(nodes)
 
-        for node_point  in track_segment.findall("g:trkpt", _GNS):
-            point_count += 1
-            point = Point(node_point)
-
-            # print(f"{point}")
-
-            last_points.append(point)
-            # print(f"ADD {point}")
-
-            if len(last_points) < smooth_point_count:
-                continue
+        elevation_significant = _elevation_significance(elevation)
 
-            # enough points to smooth
-            delta = Segment(last_points[0], last_points[-1])
-            diff = delta.distance
-            # print(f"DISTANCE {diff:10.03f}")
-            if diff < distance_threshold:
-                assert len(last_points) > 2, "Not enough points"
-                # remove entire segment except one point
-                for last_point in last_points[1:-1]:
-                    track_segment.remove(last_point.node)
-                    removed_point_count += 1
-                    # print(f"REMOVE {p.time}")
-
-                last_points = [last_points[0], last_points[-1]]
-                # print(f"{last_points[0]} LEFT")
-                continue
+        if np is not None:
+            keep = _smooth_kernel(
+                lat, lon, elevation_significant,
+                float(distance_threshold), smooth_point_count, precise,
+            )
+        else:
+            keep = _smooth_kernel_fallback(
+                lat, lon, elevation_significant,
+                float(distance_threshold), smooth_point_count, precise,
+            )
 
-            # shift script
-            last_points = last_points[1:]
-            # print(f"SHIFT to {last_points[0]}")
-            # last_points.append(point)  # bug was here
+        removed_point_count += _apply_segment_mask(track_segment, nodes, keep)
 
     remaining_point_count = point_count - removed_point_count
     print(
@@ -285,7 +1086,63 @@ def _smooth_track(
         f"{remaining_point_count} remains at {smooth_point_count}"
     )
 
-    _write_gpx(output_file_name, tree)
+
+def _simplify_track(
+    input_file_name: str,
+    output_file_name: str|None=None,
+    distance_threshold=_DISTANCE_THRESHOLD,
+    pretty: bool=True,
+) -> None:
+    """
+    Thin out points closer than `distance_threshold` meters to the last
+    kept point
+    """
+    if output_file_name is None:
+        output_file_name = input_file_name
+
+    tree = ET.parse(input_file_name, _PARSER)
+    _simplify_track_tree(tree, distance_threshold=distance_threshold)
+    _write_gpx(output_file_name, tree, pretty=pretty)
+
+
+def _simplify_track_tree(
+    tree: ET._ElementTree,
+    distance_threshold=_DISTANCE_THRESHOLD,
+) -> None:
+    """
+    Simplify an already parsed track, in place.
+
+    Unlike smoothing this accumulates distance from the last *kept*
+    point, so a slow crawl eventually emits a point instead of being
+    collapsed window by window; the elevation guard stays the same.
+    """
+    root = tree.getroot()
+
+    point_count = 0
+    removed_point_count = 0
+
+    for track_segment in _XP_SEGMENTS(root):
+        nodes, lat, lon, elevation = _segment_to_arrays(track_segment)
+        point_count += len(nodes)
+
+        if np is not None:
+            keep = _thin_kernel(
+                lat, lon, elevation,
+                float(distance_threshold), float(_ELEVATION_THRESHOLD),
+            )
+        else:
+            keep = _thin_kernel_fallback(
+                lat, lon, elevation,
+                float(distance_threshold), float(_ELEVATION_THRESHOLD),
+            )
+
+        removed_point_count += _apply_segment_mask(track_segment, nodes, keep)
+
+    remaining_point_count = point_count - removed_point_count
+    print(
+        f"Simplified {removed_point_count} points away, "
+        f"{remaining_point_count} remains at {distance_threshold}m"
+    )
 
 
 def _split_by_days(input_file_name: str, output_file_name: str=None) -> None:
@@ -297,47 +1154,56 @@ def _split_by_days(input_file_name: str, output_file_name: str=None) -> None:
 
     print(f"Split track by days {input_file_name} to {output_file_name}")
 
-    tree = ET.parse(input_file_name)
+    tree = ET.parse(input_file_name, _PARSER)
     root = tree.getroot()
+    trk = root.find(_TRK_TAG)
 
-    all_timestamps = set()
+    # parse once and read each node's time exactly once: the per-date
+    # passes below only compare the cached strings
+    waypoint_times = [(wpt, _get_time(wpt)) for wpt in root.iterfind(_WPT_TAG)]
+    segment_point_times = [
+        (track_segment, _segment_times(track_segment))
+        for track_segment in trk.iterfind(_TRKSEG_TAG)
+    ]
 
-    # find min/max times
-    trk = root.find("g:trk", _GNS)
-    for track_segment in trk.findall("g:trkseg", _GNS):
-        for point in track_segment.findall("g:trkpt", _GNS):
-            time = _get_time(point)
+    all_timestamps = set()
+    for _track_segment, point_times in segment_point_times:
+        for _point, time in point_times:
             all_timestamps.add(time)
 
     timestamps = list(sorted(all_timestamps))
     dates = list(sorted(set(t[0:10] for t in timestamps)))
-    # print(dates)
+    log.debug("dates: %s", dates)
 
     for date in dates:
-        tree = ET.parse(input_file_name)
-        root = tree.getroot()
-
-        for wpt in root.findall("g:wpt", _GNS):
-            time = _get_time(wpt)
-            if not time.startswith(date):
-                root.remove(wpt)
-
-        # remove points
-        trk = root.find("g:trk", _GNS)
-        for track_segment in trk.findall("g:trkseg", _GNS):
-            for point in track_segment.findall("g:trkpt", _GNS):
-                time = _get_time(point)
-
-                if not time.startswith(date):
-                    track_segment.remove(point)
-                    continue
-
-            # check whether at least one point remains in segment
-            if not track_segment.findall("g:trkpt", _GNS):
-                # remove empty segment
-                trk.remove(track_segment)
+        date_root = ET.Element(root.tag, attrib=root.attrib, nsmap=root.nsmap)
+        date_tree = ET.ElementTree(date_root)
+
+        # carry over gpx-level children (metadata, routes etc.)
+        for child in root:
+            if child.tag not in (_WPT_TAG, _TRK_TAG):
+                date_root.append(copy.deepcopy(child))
+
+        for wpt, time in waypoint_times:
+            if time.startswith(date):
+                date_root.append(copy.deepcopy(wpt))
+
+        date_trk = ET.SubElement(date_root, _TRK_TAG)
+        # carry over track-level metadata (name etc.)
+        for child in trk:
+            if child.tag != _TRKSEG_TAG:
+                date_trk.append(copy.deepcopy(child))
+
+        for _track_segment, point_times in segment_point_times:
+            date_points = [point for point, time in point_times if time.startswith(date)]
+            if not date_points:
+                # skip empty segment
+                continue
+            date_segment = ET.SubElement(date_trk, _TRKSEG_TAG)
+            for point in date_points:
+                date_segment.append(copy.deepcopy(point))
 
-        _write_gpx(f"{output_file_name}_{date}.gpx", tree)
+        _write_gpx(f"{output_file_name}_{date}.gpx", date_tree)
 
 
 def _exit(message):
@@ -360,9 +1226,6 @@ def main():
     """
     GPX Tools Entry Point
     """
-    ET.register_namespace("g", _NS)
-    ET.register_namespace("", _NS)
-
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
@@ -410,20 +1273,62 @@ def main():
         default=False,
         action="store_true",
     )
+    parser.add_argument(
+        "--precise-distance",
+        help="Use exact WGS-84 Vincenty distances for smoothing instead of spherical haversine",
+        required=False,
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--simplify",
+        help="Thin out points closer than the distance threshold to the last kept point",
+        required=False,
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--spatial-dedupe",
+        help="Drop points closer than the distance threshold to an earlier point (needs scipy)",
+        required=False,
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--low-memory",
+        help="Stream-merge and filter through temporary files instead of holding every input in memory",
+        required=False,
+        default=False,
+        action="store_true",
+    )
 
     args = parser.parse_args()
     output_file_name = args.output
 
+    # debug diagnostics buffer in memory and flush in batches instead of
+    # issuing a write syscall per record; enable with GPX_TOOLS_DEBUG=1
+    if os.environ.get("GPX_TOOLS_DEBUG"):
+        log.addHandler(logging.handlers.MemoryHandler(
+            capacity=1000,
+            flushLevel=logging.ERROR,
+            target=logging.StreamHandler(sys.stderr),
+        ))
+        log.setLevel(logging.DEBUG)
+
     smooth_point_count = None
     distance_threshold = None
 
-    if args.smooth:
+    if args.smooth or args.spatial_dedupe or args.simplify:
         if args.smooth_point_count:
             try:
                 smooth_point_count = int(args.smooth_point_count)
             except ValueError as exc:
                 print(f"Smooth point count must be integer value: {exc}")
                 sys.exit(1)
+            if smooth_point_count < 3:
+                # a window needs two endpoints plus a middle point
+                print("Smooth point count must be at least 3")
+                sys.exit(1)
 
         if args.distance_threshold:
             try:
@@ -441,27 +1346,87 @@ def main():
     for track in track_file_names:
         print(f"  Source: {track}")
 
+    if args.dry_run:
+        # stats only: the expat pass reads each file once without
+        # building a tree, and nothing is written
+        for track_file_name in track_file_names:
+            waypoints, segments, points, length = _track_stats(track_file_name)
+            print(
+                f"  {track_file_name}: {points} points in {segments} segments, "
+                f"{waypoints} waypoints, {length / 1000:.2f} km"
+            )
+        return
 
-    # copy first track "as is"
-    shutil.copy(track_file_names[0], output_file_name)
 
-    if len(track_file_names) > 1:
-        # merge all other tracks into it
-        for track_name in track_file_names[1:]:
-            _merge_tracks(
-                left_file_name=output_file_name,
-                right_file_name=track_name,
+    if args.low_memory:
+        # constant-memory pipeline: stream-merge to the output file, then
+        # run the remaining passes file-to-file; only the final pass pays
+        # for pretty-printing
+        _stream_merge(track_file_names, output_file_name)
+        _filter_duplicates(
+            output_file_name,
+            pretty=not (args.spatial_dedupe or args.simplify or args.smooth),
+        )
+        if args.spatial_dedupe:
+            _spatial_dedupe(
+                output_file_name,
+                distance_threshold=distance_threshold,
+                pretty=not (args.simplify or args.smooth),
             )
+        if args.simplify:
+            _simplify_track(
+                output_file_name,
+                distance_threshold=distance_threshold,
+                pretty=not args.smooth,
+            )
+        if args.smooth:
+            _smooth_track(
+                output_file_name,
+                smooth_point_count=smooth_point_count,
+                distance_threshold=distance_threshold,
+                precise=args.precise_distance,
+            )
+        if args.split:
+            _split_by_days(
+                input_file_name=output_file_name,
+                output_file_name=f"{output_file_name}_split",
+            )
+        return
+
+    # parse every input once and merge in memory: the output file is
+    # written a single time instead of being rewritten per input;
+    # lxml releases the GIL inside libxml2, so parsing runs in parallel
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        trees = list(executor.map(_parse_gpx, track_file_names))
+
+    main_tree = trees[0]
+    for track_name, right_tree in zip(track_file_names[1:], trees[1:]):
+        print(f"Merging {track_name} into {output_file_name}...")
+        _merge_roots(main_tree.getroot(), right_tree.getroot())
+
+    # filter and smooth the merged tree in memory and serialize once;
+    # with --simplify the duplicate filter fuses into the thinning pass
+    if args.simplify:
+        _filter_simplify_tree(main_tree, distance_threshold=distance_threshold)
+    else:
+        _filter_duplicates_tree(main_tree)
 
-    _filter_duplicates(output_file_name)
+    if args.spatial_dedupe:
+        _spatial_dedupe_tree(
+            main_tree,
+            distance_threshold=distance_threshold,
+        )
 
     if args.smooth:
-        _smooth_track(
-            input_file_name=output_file_name,
+        _smooth_track_tree(
+            main_tree,
             smooth_point_count=smooth_point_count,
             distance_threshold=distance_threshold,
+            precise=args.precise_distance,
         )
 
+    _write_gpx(output_file_name, main_tree)
+
     if args.split:
         _split_by_days(
             input_file_name=output_file_name,